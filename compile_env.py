@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Compile a .env file into a Python module
+
+Writes env_compiled.py with one constant per variable so that
+SnowflakeOAuthConfig can import the configuration from bytecode
+instead of parsing the .env file on every start.
+"""
+
+import os
+import sys
+from dotenv import dotenv_values
+
+from config import is_compiled_env_name
+
+
+def compile_env(env_file: str = '.env', output_file: str = 'env_compiled.py') -> int:
+    """
+    Compile a .env file into a Python module.
+    
+    Args:
+        env_file: Path to the .env file to read
+        output_file: Path of the Python module to write
+    
+    Returns:
+        int: Number of variables written
+    """
+    values = dotenv_values(env_file)
+    
+    lines = [
+        '"""',
+        f"Generated from {os.path.basename(env_file)} by compile_env.py - do not edit.",
+        '"""',
+        ''
+    ]
+    count = 0
+    for name, value in values.items():
+        if not is_compiled_env_name(name):
+            print(f"Skipping variable that is not an upper-case identifier: {name}")
+            continue
+        lines.append(f"{name} = {value or ''!r}")
+        count += 1
+    
+    # The module holds secrets, so keep it readable by the current user only
+    fd = os.open(output_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    
+    return count
+
+
+if __name__ == "__main__":
+    env_file = sys.argv[1] if len(sys.argv) > 1 else '.env'
+    output_file = sys.argv[2] if len(sys.argv) > 2 else 'env_compiled.py'
+    
+    if not os.path.exists(env_file):
+        print(f"❌ {env_file} not found")
+        sys.exit(1)
+    
+    count = compile_env(env_file, output_file)
+    print(f"✓ Wrote {count} variables from {env_file} to {output_file}")
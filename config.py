@@ -3,95 +3,228 @@ Configuration management for Snowflake OAuth authentication.
 Handles loading configuration from environment variables and .env files.
 """
 
+import keyword
 import os
-from typing import Optional
-from dotenv import load_dotenv
+import threading
+from typing import Dict, Optional, Tuple
+from dotenv import dotenv_values, load_dotenv
+
+
+_DOTENV_LOCK = threading.Lock()
+
+# Whether dotenv's default .env lookup has been loaded in this process
+_DEFAULT_DOTENV_LOADED = False
+
+# Explicit .env files loaded into os.environ, keyed by absolute path:
+# (mtime when loaded, variables the file set in os.environ)
+_DOTENV_LOADED: Dict[str, Tuple[Optional[float], Dict[str, str]]] = {}
+
+
+def _load_default_dotenv_once():
+    """Load the .env file found by dotenv's default lookup, at most once."""
+    global _DEFAULT_DOTENV_LOADED
+    with _DOTENV_LOCK:
+        if not _DEFAULT_DOTENV_LOADED:
+            load_dotenv()
+            _DEFAULT_DOTENV_LOADED = True
+
+
+def _load_env_file(env_file: str, mtime: Optional[float]):
+    """
+    Load an explicit .env file into os.environ, reloading it when it changes.
+    
+    As with load_dotenv, variables already in the environment are not
+    overridden; only variables this file set on an earlier load are updated,
+    or removed if the file no longer defines them.
+    
+    Args:
+        env_file: Path to .env file
+        mtime: Modification time of the file, used to detect edits
+    """
+    path = os.path.abspath(env_file)
+    with _DOTENV_LOCK:
+        loaded = _DOTENV_LOADED.get(path)
+        if loaded is not None and loaded[0] == mtime:
+            return
+        previous = loaded[1] if loaded is not None else {}
+        
+        values = {name: value for name, value in dotenv_values(env_file).items() if value is not None}
+        for name, value in previous.items():
+            if name not in values and os.environ.get(name) == value:
+                del os.environ[name]
+        
+        applied = {}
+        for name, value in values.items():
+            current = os.environ.get(name)
+            if current is None or current == previous.get(name):
+                os.environ[name] = value
+                applied[name] = value
+        _DOTENV_LOADED[path] = (mtime, applied)
+
+
+def is_compiled_env_name(name: str) -> bool:
+    """
+    Check whether a variable name can be stored in the env_compiled module.
+    
+    Args:
+        name: Environment variable name
+        
+    Returns:
+        bool: True for upper-case Python identifiers that are not keywords
+    """
+    return name.isidentifier() and name.isupper() and not keyword.iskeyword(name)
+
+
+def _load_compiled_env() -> Optional[Dict[str, str]]:
+    """
+    Load values from the env_compiled module generated by compile_env.py.
+    
+    Returns:
+        dict: Compiled variables, or None if the module is not deployed
+    """
+    try:
+        import env_compiled
+    except ImportError:
+        return None
+    return {name: value for name, value in vars(env_compiled).items() if is_compiled_env_name(name)}
 
 
 class SnowflakeOAuthConfig:
     """Configuration class for Snowflake OAuth authentication."""
     
+    REQUIRED_FIELDS = (
+        'azure_client_id',
+        'azure_client_secret',
+        'azure_tenant_id',
+        'snowflake_account',
+        'snowflake_warehouse',
+        'snowflake_database',
+        'snowflake_schema'
+    )
+    
     def __init__(self, env_file: Optional[str] = None):
         """
         Initialize configuration.
         
+        Without an explicit env_file, values compiled by compile_env.py are
+        used in place of parsing .env, when the env_compiled module exists.
+        
         Args:
             env_file: Path to .env file (optional)
         """
+        self._env_file = env_file
+        self._env_file_mtime = self._get_env_file_mtime()
+        self._validated = False
+        
+        # Variables set in the real environment still take precedence, as with load_dotenv
+        self._env_defaults = (None if env_file else _load_compiled_env()) or {}
         if env_file:
-            load_dotenv(env_file)
-        else:
-            load_dotenv()
+            _load_env_file(env_file, self._env_file_mtime)
+        elif not self._env_defaults:
+            _load_default_dotenv_once()
+        self._resolve_environment()
+    
+    def _get_env_file_mtime(self) -> Optional[float]:
+        """Modification time of the explicit .env file, or None if not tracked."""
+        if not self._env_file:
+            return None
+        try:
+            return os.path.getmtime(self._env_file)
+        except OSError:
+            return None
+    
+    def _getenv(self, name: str) -> str:
+        """Look up a variable in the environment, then in the compiled defaults."""
+        return os.getenv(name, self._env_defaults.get(name, ''))
+    
+    def _resolve_environment(self):
+        """Read configuration from the environment into attributes."""
+        # Resolve environment once; properties below are plain attribute reads
+        self._azure_client_id = self._getenv('AZURE_CLIENT_ID')
+        self._azure_client_secret = self._getenv('AZURE_CLIENT_SECRET')
+        self._azure_tenant_id = self._getenv('AZURE_TENANT_ID')
+        self._snowflake_account = self._getenv('SNOWFLAKE_ACCOUNT')
+        self._snowflake_warehouse = self._getenv('SNOWFLAKE_WAREHOUSE')
+        self._snowflake_database = self._getenv('SNOWFLAKE_DATABASE')
+        self._snowflake_schema = self._getenv('SNOWFLAKE_SCHEMA')
+        self._snowflake_role = self._getenv('SNOWFLAKE_ROLE')
+        
+        self._azure_token_endpoint = f"https://login.microsoftonline.com/{self._azure_tenant_id}/oauth2/v2.0/token"
+        self._snowflake_scope = f"https://{self._snowflake_account}.snowflakecomputing.com/.default"
+        self._base_connection_params = None
     
     @property
     def azure_client_id(self) -> str:
         """Azure Application (client) ID."""
-        return os.getenv('AZURE_CLIENT_ID', '')
+        return self._azure_client_id
     
     @property
     def azure_client_secret(self) -> str:
         """Azure client secret."""
-        return os.getenv('AZURE_CLIENT_SECRET', '')
+        return self._azure_client_secret
     
     @property
     def azure_tenant_id(self) -> str:
         """Azure Directory (tenant) ID."""
-        return os.getenv('AZURE_TENANT_ID', '')
+        return self._azure_tenant_id
     
     @property
     def snowflake_account(self) -> str:
         """Snowflake account identifier."""
-        return os.getenv('SNOWFLAKE_ACCOUNT', '')
+        return self._snowflake_account
     
     @property
     def snowflake_warehouse(self) -> str:
         """Snowflake warehouse name."""
-        return os.getenv('SNOWFLAKE_WAREHOUSE', '')
+        return self._snowflake_warehouse
     
     @property
     def snowflake_database(self) -> str:
         """Snowflake database name."""
-        return os.getenv('SNOWFLAKE_DATABASE', '')
+        return self._snowflake_database
     
     @property
     def snowflake_schema(self) -> str:
         """Snowflake schema name."""
-        return os.getenv('SNOWFLAKE_SCHEMA', '')
+        return self._snowflake_schema
     
     @property
     def snowflake_role(self) -> str:
         """Snowflake role name."""
-        return os.getenv('SNOWFLAKE_ROLE', '')
+        return self._snowflake_role
     
     @property
     def azure_token_endpoint(self) -> str:
         """Azure OAuth token endpoint."""
-        return f"https://login.microsoftonline.com/{self.azure_tenant_id}/oauth2/v2.0/token"
+        return self._azure_token_endpoint
     
     @property
     def snowflake_scope(self) -> str:
         """Snowflake OAuth scope."""
-        return f"https://{self.snowflake_account}.snowflakecomputing.com/.default"
+        return self._snowflake_scope
     
     def validate(self) -> bool:
         """
         Validate that all required configuration is present.
         
+        A successful result is cached; if the .env file passed to the
+        constructor has been modified since, it is reloaded and re-validated.
+        
         Returns:
             bool: True if all required config is present, False otherwise
         """
-        required_fields = [
-            'azure_client_id',
-            'azure_client_secret', 
-            'azure_tenant_id',
-            'snowflake_account',
-            'snowflake_warehouse',
-            'snowflake_database',
-            'snowflake_schema'
-        ]
+        mtime = self._get_env_file_mtime()
+        if mtime is not None and mtime != self._env_file_mtime:
+            _load_env_file(self._env_file, mtime)
+            self._resolve_environment()
+            self._env_file_mtime = mtime
+            self._validated = False
+        
+        if self._validated:
+            return True
         
         missing_fields = []
-        for field in required_fields:
+        for field in self.REQUIRED_FIELDS:
             if not getattr(self, field):
                 missing_fields.append(field.upper())
         
@@ -99,6 +232,7 @@ class SnowflakeOAuthConfig:
             print(f"Missing required configuration: {', '.join(missing_fields)}")
             return False
         
+        self._validated = True
         return True
     
     def get_connection_params(self) -> dict:
@@ -115,3 +249,20 @@ class SnowflakeOAuthConfig:
             'schema': self.snowflake_schema,
             'role': self.snowflake_role if self.snowflake_role else None
         }
+    
+    def get_base_connection_params(self) -> dict:
+        """
+        Get the static OAuth connection parameters, built once and cached.
+        
+        The returned dict has None values removed and 'authenticator' set to
+        'oauth'; it is shared, so callers should merge rather than mutate it,
+        e.g. ``{**config.get_base_connection_params(), 'token': token}``.
+        
+        Returns:
+            dict: Connection parameters without the token
+        """
+        if self._base_connection_params is None:
+            params = {k: v for k, v in self.get_connection_params().items() if v is not None}
+            params['authenticator'] = 'oauth'
+            self._base_connection_params = params
+        return self._base_connection_params
@@ -3,58 +3,237 @@ OAuth authentication module for Snowflake using Azure Service Principal.
 Handles token acquisition and validation.
 """
 
-import requests
+import urllib3
+from urllib.parse import urlencode
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 import json
 
+try:
+    # Optional C-accelerated parser for token responses
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+# Cache key: (client_id, scope)
+TokenCacheKey = Tuple[str, str]
+# Cache entry: (access_token, expires_at, refresh_after), both times from time.monotonic()
+TokenCacheEntry = Tuple[str, float, float]
+
+# Directory for tokens persisted between runs
+TOKEN_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'snowflake-oauth-test')
+
+# Seconds before real expiry at which a token stops being used
+TOKEN_EXPIRY_BUFFER = 300
+
+# Seconds to wait before retrying a failed background refresh
+TOKEN_REFRESH_RETRY = 30
+
+
+def _refresh_delay(expires_in: float) -> float:
+    """
+    Seconds after issue at which a token should be refreshed in the background.
+    
+    Normally 80% of the token lifetime, clamped so that the refresh point
+    (and one retry) falls before the buffered expiry of short-lived tokens.
+    
+    Args:
+        expires_in: Token lifetime in seconds as reported by Azure AD
+        
+    Returns:
+        float: Refresh delay in seconds
+    """
+    usable = expires_in - TOKEN_EXPIRY_BUFFER
+    return max(min(expires_in * 0.8, usable - TOKEN_REFRESH_RETRY), usable * 0.5)
+
 
 class SnowflakeOAuthAuthenticator:
     """OAuth authenticator for Snowflake using Azure Service Principal."""
     
-    def __init__(self, config):
+    def __init__(self, config, persist_tokens: bool = True):
         """
         Initialize OAuth authenticator.
         
         Args:
             config: SnowflakeOAuthConfig instance
+            persist_tokens: Persist tokens under TOKEN_CACHE_DIR so reruns can reuse them
         """
         self.config = config
         self.logger = logging.getLogger(__name__)
-        self._access_token = None
-        self._token_expires_at = None
+        # Tokens per (client_id, scope) so different scopes do not evict each other
+        self._cache: Dict[TokenCacheKey, TokenCacheEntry] = {}
+        
+        # Expired tokens read from disk, used only if Azure AD is unreachable
+        self.persist_tokens = persist_tokens
+        self._stale_tokens: Dict[TokenCacheKey, str] = {}
+        
+        # Single-worker executor for proactive refreshes, created on first use
+        self._refresh_lock = threading.Lock()
+        self._refresh_executor: Optional[ThreadPoolExecutor] = None
+        self._refresh_futures: Dict[TokenCacheKey, Future] = {}
+        
+        # Connection pool so token refreshes reuse the TLS connection to Azure AD
+        self._http = urllib3.PoolManager(num_pools=1, maxsize=2)
+        
+        if self.persist_tokens:
+            self._load_persisted_token(self._cache_key())
     
-    def get_access_token(self, force_refresh: bool = False) -> str:
+    def _cache_key(self, scope: Optional[str] = None) -> TokenCacheKey:
+        """Build the token cache key, defaulting to the configured Snowflake scope."""
+        return (self.config.azure_client_id, scope or self.config.snowflake_scope)
+    
+    def _token_cache_path(self, key: TokenCacheKey) -> str:
+        """Path of the persisted token file for a cache key."""
+        digest = hashlib.sha256(''.join(key).encode('utf-8')).hexdigest()
+        return os.path.join(TOKEN_CACHE_DIR, f"token-{digest}.json")
+    
+    def _load_persisted_token(self, key: TokenCacheKey) -> Optional[TokenCacheEntry]:
+        """
+        Load a persisted token for key into the in-memory cache.
+        
+        Tokens still outside the expiry buffer are cached as usual; anything
+        older is kept only as a stale fallback for when Azure AD is unreachable.
+        
+        Args:
+            key: Cache key (client_id, scope) to load
+            
+        Returns:
+            tuple: Cache entry if a usable token was loaded, None otherwise
+        """
+        path = self._token_cache_path(key)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            access_token = data['access_token']
+            expires_at = float(data['expires_at'])
+            refresh_after = float(data['refresh_after'])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.warning(f"Ignoring unreadable token cache file {path}: {e}")
+            return None
+        
+        # Translate wall-clock timestamps from the file to monotonic deadlines
+        wall_now = time.time()
+        if wall_now >= expires_at - TOKEN_EXPIRY_BUFFER:
+            self._stale_tokens[key] = access_token
+            return None
+        
+        now = time.monotonic()
+        entry = (access_token,
+                 now + (expires_at - TOKEN_EXPIRY_BUFFER - wall_now),
+                 now + (refresh_after - wall_now))
+        self._cache[key] = entry
+        self.logger.debug("Loaded access token from disk cache")
+        return entry
+    
+    def _persist_token(self, key: TokenCacheKey, access_token: str, expires_in: float):
+        """Write a token for key to disk, readable only by the current user."""
+        path = self._token_cache_path(key)
+        wall_now = time.time()
+        data = {
+            'access_token': access_token,
+            'expires_at': wall_now + expires_in,
+            'refresh_after': wall_now + _refresh_delay(expires_in)
+        }
+        try:
+            os.makedirs(TOKEN_CACHE_DIR, mode=0o700, exist_ok=True)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+        except OSError as e:
+            self.logger.warning(f"Failed to persist access token to {path}: {e}")
+    
+    def get_access_token(self, force_refresh: bool = False, scope: Optional[str] = None) -> str:
         """
         Get a valid access token, refreshing if necessary.
         
+        Once a cached token passes its refresh point it is still returned, and
+        a replacement is requested in the background so callers on the token
+        boundary do not wait on Azure AD.
+        
         Args:
             force_refresh: Force token refresh even if current token is valid
-            
+            scope: OAuth scope to request (defaults to the configured Snowflake scope)
+        
         Returns:
             str: Valid access token
-            
+        
         Raises:
             Exception: If token acquisition fails
         """
+        key = self._cache_key(scope)
+        
         # Check if we have a valid token
-        if (not force_refresh and 
-            self._access_token and 
-            self._token_expires_at and 
-            datetime.now() < self._token_expires_at):
-            self.logger.debug("Using cached access token")
-            return self._access_token
+        entry = self._cache.get(key)
+        if entry is None and self.persist_tokens and not force_refresh:
+            entry = self._load_persisted_token(key)
+        if not force_refresh and entry is not None:
+            access_token, expires_at, refresh_after = entry
+            now = time.monotonic()
+            if now < expires_at:
+                self.logger.debug("Using cached access token")
+                if now >= refresh_after:
+                    self._schedule_refresh(key)
+                return access_token
         
+        return self._refresh_token(key)
+    
+    def _schedule_refresh(self, key: TokenCacheKey):
+        """Submit a background token refresh for key unless one is already in flight."""
+        with self._refresh_lock:
+            future = self._refresh_futures.get(key)
+            if future is not None and not future.done():
+                return
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=1)
+            self.logger.debug("Scheduling background token refresh")
+            self._refresh_futures[key] = self._refresh_executor.submit(self._background_refresh, key)
+    
+    def _background_refresh(self, key: TokenCacheKey):
+        """Refresh the token for key, keeping the current one if the refresh fails."""
+        try:
+            self._refresh_token(key)
+        except Exception as e:
+            self.logger.warning(f"Background token refresh failed, keeping current token: {e}")
+            # Back off so callers do not resubmit the refresh on every request
+            entry = self._cache.get(key)
+            if entry is not None:
+                access_token, expires_at, _ = entry
+                self._cache[key] = (access_token, expires_at, time.monotonic() + TOKEN_REFRESH_RETRY)
+    
+    def _refresh_token(self, key: TokenCacheKey) -> str:
+        """
+        Request a new access token from Azure AD and cache it.
+        
+        Args:
+            key: Cache key (client_id, scope) to request a token for
+        
+        Returns:
+            str: New access token
+        
+        Raises:
+            Exception: If token acquisition fails
+        """
         self.logger.info("Acquiring new access token from Azure AD")
         
+        client_id, scope = key
+        
         # Prepare token request
-        token_data = {
+        token_data = urlencode({
             'grant_type': 'client_credentials',
-            'client_id': self.config.azure_client_id,
+            'client_id': client_id,
             'client_secret': self.config.azure_client_secret,
-            'scope': self.config.snowflake_scope
-        }
+            'scope': scope
+        }).encode('utf-8')
         
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded'
@@ -62,30 +241,63 @@ class SnowflakeOAuthAuthenticator:
         
         try:
             # Request token from Azure AD
-            response = requests.post(
+            response = self._http.request(
+                'POST',
                 self.config.azure_token_endpoint,
-                data=token_data,
+                body=token_data,
                 headers=headers,
-                timeout=30
+                timeout=30,
+                retries=False
             )
             
-            response.raise_for_status()
-            token_response = response.json()
+            # Only parse JSON bodies; proxies and outages can return HTML pages
+            content_type = response.headers.get('Content-Type', '')
+            is_json = 'json' in content_type
+            token_response = _json_loads(response.data) if is_json else {}
+            
+            # Azure AD reports failures as {"error": ..., "error_description": ...}
+            if 'error' in token_response:
+                raise Exception(f"{token_response['error']}: {token_response.get('error_description', '')}")
+            
+            if response.status >= 400:
+                raise urllib3.exceptions.HTTPError(
+                    f"{response.status} {response.reason} for url: {self.config.azure_token_endpoint}"
+                )
+            
+            if not is_json:
+                raise Exception(f"Unexpected response content type from Azure AD: {content_type}")
             
             # Extract token and expiration
-            self._access_token = token_response.get('access_token')
+            access_token = token_response.get('access_token')
             expires_in = token_response.get('expires_in', 3600)  # Default 1 hour
             
-            if not self._access_token:
+            if not access_token:
                 raise Exception("No access token received from Azure AD")
             
-            # Calculate expiration time (with 5 minute buffer)
-            self._token_expires_at = datetime.now() + timedelta(seconds=expires_in - 300)
+            # Calculate expiration time (with 5 minute buffer) and refresh point
+            now = time.monotonic()
+            self._cache[key] = (access_token, now + (expires_in - TOKEN_EXPIRY_BUFFER), now + _refresh_delay(expires_in))
+            self._stale_tokens.pop(key, None)
+            if self.persist_tokens:
+                self._persist_token(key, access_token, expires_in)
             
-            self.logger.info(f"Successfully acquired access token, expires at {self._token_expires_at}")
-            return self._access_token
+            self.logger.info("Successfully acquired access token, expires in %s seconds", expires_in - TOKEN_EXPIRY_BUFFER)
+            return access_token
             
-        except requests.exceptions.RequestException as e:
+        except (urllib3.exceptions.TimeoutError, urllib3.exceptions.ProtocolError) as e:
+            stale_token = self._stale_tokens.get(key)
+            if stale_token is None:
+                self.logger.error(f"HTTP error during token acquisition: {e}")
+                raise Exception(f"Failed to acquire access token: {e}")
+            # Stale-while-revalidate: Azure AD is unreachable, so try the stale token.
+            # Cache it briefly so callers reuse it, and retry Azure AD in the background
+            # once the refresh point passes instead of blocking on every call. The entry
+            # stays in _stale_tokens, so validate_token() still reports it as invalid.
+            self.logger.warning(f"Azure AD unreachable, falling back to stale cached token: {e}")
+            now = time.monotonic()
+            self._cache[key] = (stale_token, now + 2 * TOKEN_REFRESH_RETRY, now + TOKEN_REFRESH_RETRY)
+            return stale_token
+        except urllib3.exceptions.HTTPError as e:
             self.logger.error(f"HTTP error during token acquisition: {e}")
             raise Exception(f"Failed to acquire access token: {e}")
         except json.JSONDecodeError as e:
@@ -95,37 +307,91 @@ class SnowflakeOAuthAuthenticator:
             self.logger.error(f"Unexpected error during token acquisition: {e}")
             raise
     
-    def validate_token(self) -> bool:
+    def _is_stale(self, key: TokenCacheKey, entry: Optional[TokenCacheEntry]) -> bool:
+        """Whether a cache entry is an expired token served as a fallback."""
+        return entry is not None and self._stale_tokens.get(key) == entry[0]
+    
+    def validate_token(self, scope: Optional[str] = None) -> bool:
         """
         Validate the current access token.
         
+        Stale fallback tokens served while Azure AD is unreachable are
+        reported as invalid.
+        
+        Args:
+            scope: OAuth scope to check (defaults to the configured Snowflake scope)
+        
         Returns:
             bool: True if token is valid, False otherwise
         """
-        if not self._access_token:
-            return False
-        
-        if not self._token_expires_at:
-            return False
-        
-        return datetime.now() < self._token_expires_at
+        key = self._cache_key(scope)
+        entry = self._cache.get(key)
+        return (entry is not None and
+                time.monotonic() < entry[1] and
+                not self._is_stale(key, entry))
     
-    def get_token_info(self) -> Dict[str, Any]:
+    def get_token_info(self, scope: Optional[str] = None) -> Dict[str, Any]:
         """
         Get information about the current token.
         
+        Args:
+            scope: OAuth scope to report on (defaults to the configured Snowflake scope)
+        
         Returns:
             dict: Token information including expiration status
         """
+        key = self._cache_key(scope)
+        entry = self._cache.get(key)
+        
+        expires_at = None
+        expires_in_seconds = None
+        if entry is not None:
+            # Convert the monotonic deadline to wall-clock time only for reporting
+            expires_in_seconds = entry[1] - time.monotonic()
+            expires_at = (datetime.now() + timedelta(seconds=expires_in_seconds)).isoformat()
+        
         return {
-            'has_token': bool(self._access_token),
-            'is_valid': self.validate_token(),
-            'expires_at': self._token_expires_at.isoformat() if self._token_expires_at else None,
-            'expires_in_seconds': (self._token_expires_at - datetime.now()).total_seconds() if self._token_expires_at else None
+            'has_token': entry is not None,
+            'is_valid': self.validate_token(scope),
+            'is_stale': self._is_stale(key, entry),
+            'expires_at': expires_at,
+            'expires_in_seconds': expires_in_seconds
         }
     
+    def find(self, query: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """
+        Find cached tokens matching a query, e.g. ``find({'scope': scope})``.
+        
+        Args:
+            query: Mapping of 'client_id' and/or 'scope' to match; None matches all
+        
+        Returns:
+            list: Matching cache entries without the token value itself
+        """
+        query = query or {}
+        now = time.monotonic()
+        matches = []
+        for key, cache_entry in self._cache.items():
+            client_id, scope = key
+            expires_at = cache_entry[1]
+            entry = {'client_id': client_id, 'scope': scope}
+            if all(entry.get(field) == value for field, value in query.items()):
+                entry['is_stale'] = self._is_stale(key, cache_entry)
+                entry['is_valid'] = now < expires_at and not entry['is_stale']
+                entry['expires_in_seconds'] = expires_at - now
+                matches.append(entry)
+        return matches
+    
     def clear_token(self):
-        """Clear the cached access token."""
-        self._access_token = None
-        self._token_expires_at = None
+        """Clear the in-memory access tokens (persisted tokens are kept)."""
+        self._cache.clear()
         self.logger.info("Cleared cached access token")
+    
+    def close(self):
+        """Stop background refreshes and close pooled HTTP connections."""
+        with self._refresh_lock:
+            if self._refresh_executor is not None:
+                self._refresh_executor.shutdown(wait=True)
+                self._refresh_executor = None
+                self._refresh_futures.clear()
+        self._http.clear()
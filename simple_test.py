@@ -9,7 +9,6 @@ to connect to Snowflake and execute a basic query.
 import logging
 from config import SnowflakeOAuthConfig
 from oauth_auth import SnowflakeOAuthAuthenticator
-import snowflake.connector
 
 # Setup basic logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -37,14 +36,10 @@ def simple_connection_test():
         logger.info("✓ OAuth token acquired successfully")
         
         # Prepare connection parameters
-        conn_params = config.get_connection_params()
-        conn_params.update({
-            'authenticator': 'oauth',
-            'token': token
-        })
+        conn_params = {**config.get_base_connection_params(), 'token': token}
         
-        # Remove None values
-        conn_params = {k: v for k, v in conn_params.items() if v is not None}
+        # Imported here so config-only failures skip the heavy connector import
+        import snowflake.connector
         
         # Connect to Snowflake
         logger.info("Connecting to Snowflake...")
@@ -58,9 +53,9 @@ def simple_connection_test():
         result = cursor.fetchone()
         
         logger.info("✓ Query executed successfully")
-        logger.info(f"Snowflake Version: {result[0]}")
-        logger.info(f"Current User: {result[1]}")
-        logger.info(f"Current Role: {result[2]}")
+        logger.info("Snowflake Version: %s", result[0])
+        logger.info("Current User: %s", result[1])
+        logger.info("Current Role: %s", result[2])
         
         # Clean up
         cursor.close()
@@ -6,11 +6,11 @@ with an Azure Service Principal. It includes comprehensive testing and validatio
 """
 
 import logging
+import logging.handlers
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any
-import snowflake.connector
-from snowflake.connector import DictCursor
 
 from config import SnowflakeOAuthConfig
 from oauth_auth import SnowflakeOAuthAuthenticator
@@ -30,17 +30,30 @@ class SnowflakeConnectionTester:
         self.authenticator = SnowflakeOAuthAuthenticator(self.config)
         self.logger = logging.getLogger(__name__)
         self.connection = None
+        # One cursor per test phase, so phases can run concurrently on the connection
+        self._cursors: Dict[str, Any] = {}
+        self._log_buffer = None
     
     def setup_logging(self, level: str = 'INFO'):
         """Setup logging configuration."""
+        # Buffer file writes; flushed on errors, when full, and in cleanup()
+        self._log_buffer = logging.handlers.MemoryHandler(
+            capacity=512,
+            flushLevel=logging.ERROR,
+            target=logging.FileHandler('snowflake_oauth_test.log')
+        )
+        
         logging.basicConfig(
             level=getattr(logging, level.upper()),
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             handlers=[
                 logging.StreamHandler(sys.stdout),
-                logging.FileHandler('snowflake_oauth_test.log')
+                self._log_buffer
             ]
         )
+        
+        # basicConfig only formats the handlers it is given, so share it with the file
+        self._log_buffer.target.setFormatter(self._log_buffer.formatter)
     
     def validate_configuration(self) -> bool:
         """
@@ -77,7 +90,11 @@ class SnowflakeConnectionTester:
             
             # Validate token
             token_info = self.authenticator.get_token_info()
-            self.logger.info(f"Token info: {token_info}")
+            self.logger.info("Token info: %s", token_info)
+            
+            if token_info['is_stale']:
+                self.logger.error("Azure AD is unreachable; only an expired cached token is available")
+                return False
             
             if not token_info['is_valid']:
                 self.logger.error("Acquired token is not valid")
@@ -104,16 +121,15 @@ class SnowflakeConnectionTester:
             token = self.authenticator.get_access_token()
             
             # Prepare connection parameters
-            conn_params = self.config.get_connection_params()
-            conn_params.update({
-                'authenticator': 'oauth',
-                'token': token
-            })
+            conn_params = {**self.config.get_base_connection_params(), 'token': token}
             
-            # Remove None values
-            conn_params = {k: v for k, v in conn_params.items() if v is not None}
+            self.logger.info("Connecting with parameters: %s", list(conn_params))
             
-            self.logger.info(f"Connecting with parameters: {list(conn_params.keys())}")
+            # Imported here so config-only failures skip the heavy connector import
+            import snowflake.connector
+            
+            # Close any previous connection so cached cursors never outlive it
+            self._close_connection()
             
             # Establish connection
             self.connection = snowflake.connector.connect(**conn_params)
@@ -129,6 +145,21 @@ class SnowflakeConnectionTester:
             self.logger.error(f"Snowflake connection failed: {e}")
             return False
     
+    def _get_cursor(self, phase: str):
+        """
+        Get the cursor for a test phase, creating it on first use.
+        
+        Args:
+            phase: Name of the test phase using the cursor
+            
+        Returns:
+            SnowflakeCursor: Tuple cursor on the active connection
+        """
+        cursor = self._cursors.get(phase)
+        if cursor is None:
+            cursor = self._cursors[phase] = self.connection.cursor()
+        return cursor
+    
     def test_basic_queries(self) -> bool:
         """
         Test basic Snowflake queries.
@@ -143,26 +174,28 @@ class SnowflakeConnectionTester:
         self.logger.info("Testing basic queries...")
         
         test_queries = [
-            ("SELECT CURRENT_VERSION()", "Snowflake version"),
-            ("SELECT CURRENT_ACCOUNT()", "Current account"),
-            ("SELECT CURRENT_WAREHOUSE()", "Current warehouse"),
-            ("SELECT CURRENT_DATABASE()", "Current database"),
-            ("SELECT CURRENT_SCHEMA()", "Current schema"),
-            ("SELECT CURRENT_ROLE()", "Current role"),
-            ("SELECT CURRENT_USER()", "Current user"),
-            ("SELECT CURRENT_TIMESTAMP()", "Current timestamp")
+            ("CURRENT_VERSION()", "Snowflake version"),
+            ("CURRENT_ACCOUNT()", "Current account"),
+            ("CURRENT_WAREHOUSE()", "Current warehouse"),
+            ("CURRENT_DATABASE()", "Current database"),
+            ("CURRENT_SCHEMA()", "Current schema"),
+            ("CURRENT_ROLE()", "Current role"),
+            ("CURRENT_USER()", "Current user"),
+            ("CURRENT_TIMESTAMP()", "Current timestamp")
         ]
         
         try:
-            cursor = self.connection.cursor(DictCursor)
+            cursor = self._get_cursor('basic_queries')
             
-            for query, description in test_queries:
-                self.logger.info(f"Executing: {description}")
-                cursor.execute(query)
-                result = cursor.fetchone()
-                self.logger.info(f"Result: {result}")
+            # Fetch all context functions in a single round-trip
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info("Executing: %s", ', '.join(d for _, d in test_queries))
+            cursor.execute(f"SELECT {', '.join(q for q, _ in test_queries)}")
+            result = cursor.fetchone()
+            
+            for (_, description), value in zip(test_queries, result):
+                self.logger.info("%s: %s", description, value)
             
-            cursor.close()
             self.logger.info("All basic queries executed successfully")
             return True
             
@@ -170,6 +203,27 @@ class SnowflakeConnectionTester:
             self.logger.error(f"Query execution failed: {e}")
             return False
     
+    def _count_rows(self, cursor, batch_size: int = 1000) -> int:
+        """
+        Count the rows of the last executed query without materializing them all.
+        
+        Args:
+            cursor: Cursor with an executed query
+            batch_size: Rows to fetch per batch when rowcount is unavailable
+            
+        Returns:
+            int: Number of result rows
+        """
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            return cursor.rowcount
+        
+        count = 0
+        batch = cursor.fetchmany(batch_size)
+        while batch:
+            count += len(batch)
+            batch = cursor.fetchmany(batch_size)
+        return count
+    
     def test_permissions(self) -> bool:
         """
         Test basic permissions and access.
@@ -191,15 +245,13 @@ class SnowflakeConnectionTester:
         ]
         
         try:
-            cursor = self.connection.cursor(DictCursor)
+            cursor = self._get_cursor('permissions')
             
             for query, description in permission_queries:
-                self.logger.info(f"Testing: {description}")
+                self.logger.info("Testing: %s", description)
                 cursor.execute(query)
-                results = cursor.fetchall()
-                self.logger.info(f"Found {len(results)} results")
+                self.logger.info("Found %d results", self._count_rows(cursor))
             
-            cursor.close()
             self.logger.info("Permission tests completed successfully")
             return True
             
@@ -242,34 +294,51 @@ class SnowflakeConnectionTester:
             self.logger.error("Snowflake connection test failed, stopping tests")
             return results
         
-        # Test basic queries
-        results['basic_queries'] = self.test_basic_queries()
-        
-        # Test permissions
-        results['permissions'] = self.test_permissions()
+        # Test basic queries and permissions concurrently on separate cursors
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            basic_queries = executor.submit(self.test_basic_queries)
+            permissions = executor.submit(self.test_permissions)
+            results['basic_queries'] = basic_queries.result()
+            results['permissions'] = permissions.result()
         
         # Summary
         passed_tests = sum(results.values())
         total_tests = len(results)
         
-        self.logger.info(f"Test Summary: {passed_tests}/{total_tests} tests passed")
+        self.logger.info("Test Summary: %d/%d tests passed", passed_tests, total_tests)
         
         for test_name, result in results.items():
             status = "PASSED" if result else "FAILED"
-            self.logger.info(f"  {test_name}: {status}")
+            self.logger.info("  %s: %s", test_name, status)
         
         return results
     
-    def cleanup(self):
-        """Clean up connections and resources."""
+    def _close_connection(self):
+        """Close the cached cursors and the active Snowflake connection, if any."""
+        for cursor in self._cursors.values():
+            try:
+                cursor.close()
+            except Exception as e:
+                self.logger.error(f"Error closing cursor: {e}")
+        self._cursors.clear()
+        
         if self.connection:
             try:
                 self.connection.close()
                 self.logger.info("Snowflake connection closed")
             except Exception as e:
                 self.logger.error(f"Error closing connection: {e}")
+            self.connection = None
+    
+    def cleanup(self):
+        """Clean up connections and resources."""
+        self._close_connection()
         
         self.authenticator.clear_token()
+        self.authenticator.close()
+        
+        if self._log_buffer:
+            self._log_buffer.flush()
 
 
 def main():